@@ -164,6 +164,8 @@ class Element(pya.PCellDeclarationHelper):
                 subtype = to_library_name(cls.__name__)
                 _redef_param(params[f"{mod}_type"], subtype, choices=[subtype], hidden=True)
 
+        self._layer_cache = None  # see produce_impl and get_layer
+
         # create KLayout's PCellParameterDeclaration objects
         self._param_value_map = {}
         for name, p in cls.get_schema().items():
@@ -422,17 +424,21 @@ class Element(pya.PCellDeclarationHelper):
         Adds all refpoints to user properties and draws their names to the annotation layer.
         """
         self.refpoints = {}
+        self._layer_cache = {}  # layer indices are cached only while producing, when the layout is fixed
 
-        # Put general "infrastructure actions" here, before build()
-        self.refpoints["base"] = pya.DPoint(0, 0)
+        try:
+            # Put general "infrastructure actions" here, before build()
+            self.refpoints["base"] = pya.DPoint(0, 0)
 
-        self.build()
+            self.build()
 
-        self.post_build()
+            self.post_build()
 
-        for name, refpoint in self.refpoints.items():
-            text = pya.DText(name, refpoint.x, refpoint.y)
-            self.cell.shapes(self.get_layer("refpoints")).insert(text)
+            for name, refpoint in self.refpoints.items():
+                text = pya.DText(name, refpoint.x, refpoint.y)
+                self.cell.shapes(self.get_layer("refpoints")).insert(text)
+        finally:
+            self._layer_cache = None
 
     def _etch_opposite_face(self):
         """Add opposite face etching, if enabled."""
@@ -471,9 +477,19 @@ class Element(pya.PCellDeclarationHelper):
             layer_name: layer name text
             face_id: Name or index of the face to use, default=0
         """
+        cache = self._layer_cache
+        if cache is not None:
+            # face_ids may be changed during build(), so the key is the resolved face instead of face_id
+            key = (layer_name, resolve_face(face_id, self.face_ids), face_id == 0)
+            if key in cache:
+                return cache[key]
         if (face_id == 0) and (layer_name not in self.face(0)):
-            return self.layout.layer(default_layers[layer_name])
-        return self.layout.layer(self.face(face_id)[layer_name])
+            layer = self.layout.layer(default_layers[layer_name])
+        else:
+            layer = self.layout.layer(self.face(face_id)[layer_name])
+        if cache is not None:
+            cache[key] = layer
+        return layer
 
     @staticmethod
     def _create_cell(elem_cls, layout, library=None, **parameters) -> pya.Cell:
@@ -17,7 +17,7 @@
 # and organizations (meetiqm.com/iqm-organization-contributor-license-agreement).
 
 
-from math import pi, cos, sin, tan, atan, atan2, degrees, sqrt
+from math import pi, cos, sin, atan, atan2, degrees, sqrt
 from scipy.optimize import brentq
 from kqcircuits.util.parameters import add_parameters_from
 from kqcircuits.elements.waveguide_coplanar_straight import WaveguideCoplanarStraight
@@ -29,6 +29,7 @@ from kqcircuits.elements.airbridges.airbridge import Airbridge
 from kqcircuits.elements.element import Element
 from kqcircuits.elements.waveguide_coplanar import WaveguideCoplanar
 from kqcircuits.util.geometry_helper import vector_length_and_direction, get_angle
+from kqcircuits.util.waveguide_math import corner_from_angles
 
 
 @add_parameters_from(WaveguideCoplanarStraight, "ground_grid_in_trace")
@@ -162,13 +163,18 @@ class Meander(Element):
         dist_to_next = bridge_separation
         n_inserted = 0
 
+        # Segment vectors and angles are computed once, since each of them is shared by two neighbouring corners
+        segments = [points[i + 1] - points[i] for i in range(len(points) - 1)]
+        angles = [atan2(v.y, v.x) for v in segments]
+
         # Insert airbridges on bends and between bends
         for i in range(1, len(points) - 1):
-            v1, _, a1, a2, c_pos = WaveguideCoplanar.get_corner_data(points[i - 1], points[i], points[i + 1], self.r)
-            alpha = (a2 - a1 + pi) % (2 * pi) - pi  # turn angle (between -pi and pi) in radians
+            a1, a2 = angles[i - 1], angles[i]
+            # turn angle (between -pi and pi) in radians, and distance between corner point and beginning of straights
+            alpha, cut_dist, c_x, c_y = corner_from_angles(points[i].x, points[i].y, a1, a2, self.r)
+            c_pos = pya.DPoint(c_x, c_y)
             sign_r = self.r if alpha > 0 else -self.r  # positive or negative radius depending on turn signature
-            length, direction = vector_length_and_direction(v1)
-            cut_dist = self.r * tan(abs(alpha) / 2)  # distance between corner point and beginning of straights
+            length, direction = vector_length_and_direction(segments[i - 1])
 
             dist_to_next -= length - cut_dist
             while dist_to_next <= 0.0:  # insert airbridges on straight segment before corner
@@ -188,7 +194,7 @@ class Meander(Element):
             dist_to_next += cut_dist
 
         # Insert airbridges on the last segment
-        length, direction = vector_length_and_direction(points[-1] - points[-2])
+        length, direction = vector_length_and_direction(segments[-1])
         dist_to_next -= length
         while dist_to_next <= 0.0:  # insert airbridges on last straight segment
             insert_bridge(points[-1] + dist_to_next * direction, get_angle(direction))
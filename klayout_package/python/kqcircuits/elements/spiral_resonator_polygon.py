@@ -335,9 +335,8 @@ class SpiralResonatorPolygon(Element):
                 curve_cell = self.add_element(
                     WaveguideCoplanarCurved, alpha=curve_alpha, face_ids=[self.face_ids[face]]
                 )
-                curve_trans = pya.DCplxTrans(
-                    1, degrees(alpha1) - v1.vprod_sign(v2) * 90, v1.vprod_sign(v2) < 0, corner_pos
-                )
+                turn_sign = v1.vprod_sign(v2)
+                curve_trans = pya.DCplxTrans(1, degrees(alpha1) - turn_sign * 90, turn_sign < 0, corner_pos)
                 self.insert_cell(curve_cell, curve_trans)
                 WaveguideCoplanarCurved.produce_curve_termination(self, curve_alpha, self.term2, curve_trans, face)
                 return True
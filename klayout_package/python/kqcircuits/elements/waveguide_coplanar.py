@@ -19,8 +19,11 @@
 
 import math
 
+import numpy as np
+
 from kqcircuits.pya_resolver import pya
 from kqcircuits.util.parameters import Param, pdt, add_parameters_from
+from kqcircuits.util.waveguide_math import corner_core, connected_endpoints
 
 from kqcircuits.elements.element import Element
 from kqcircuits.elements.waveguide_coplanar_straight import WaveguideCoplanarStraight
@@ -32,7 +35,8 @@ class WaveguideCoplanar(Element):
     """The PCell declaration for an arbitrary coplanar waveguide.
 
     Coplanar waveguide defined by the width of the center conductor and gap. It can follow any segmented lines with
-    predefined bending radios. It actually consists of straight and bent PCells. Termination lengths are lengths of
+    predefined bending radios. It actually consists of straight and bent PCells, unless ``fuse_geometry`` is set, in
+    which case the shapes are produced directly into the waveguide cell. Termination lengths are lengths of
     extra ground gaps for opened transmission lines
 
     The ``path`` parameter defines the waypoints of the waveguide. When a DPath is supplied, the waypoints can be edited
@@ -57,6 +61,12 @@ class WaveguideCoplanar(Element):
         unit="μm",
         docstring="Extend straight sections near corners by this amount (μm) to ensure all sections overlap",
     )
+    fuse_geometry = Param(
+        pdt.TypeBoolean,
+        "Produce geometry without straight and curved subcells",
+        False,
+        docstring="Produce one shape per layer for the whole waveguide instead of separate straight and curved cells",
+    )
 
     def can_create_from_shape_impl(self):
         return self.shape.is_path()
@@ -79,53 +89,93 @@ class WaveguideCoplanar(Element):
                 "Need at least 2 points for a waveguide.", points[0] if len(points) == 1 else pya.DPoint()
             )
 
+        r = self.r
+        overlap = self.corner_safety_overlap
+
+        # Corner geometry of all corners is computed at once. Corner i is located at points[i + 1].
+        xy = np.array([(p.x, p.y) for p in points])
+        corner_arrays = self._orthogonal_corner_arrays(xy, r)
+        if corner_arrays is None:
+            corner_arrays = self._corner_arrays(xy, r)
+        lengths, alphas, angles, turns, signs, tan_halfs, corners = corner_arrays
+
+        cut_dists = r * tan_halfs - overlap  # distances between corner points and beginnings of the straights
+        curve_angles = (angles[:-1] - 90 * signs).tolist()  # rotations of the curved cells
+
+        lengths, angles, cut_dists = lengths.tolist(), angles.tolist(), cut_dists.tolist()
+        corner_positions = [pya.DPoint(x, y) for x, y in corners.tolist()]
+        coords = xy.tolist()
+
+        def point_on_segment(i, dist):
+            """Returns the point at distance ``dist`` from points[i] towards points[i + 1]."""
+            (x0, y0), (x1, y1) = coords[i], coords[i + 1]
+            k = dist / lengths[i]
+            return pya.DPoint(x0 + k * (x1 - x0), y0 + k * (y1 - y0))
+
+        # Straight cells are shared between segments of equal length in database units
+        straight_cells = {}
+        dbu = self.layout.dbu
+
+        def straight_cell(length):
+            key = round(length / dbu)
+            cell = straight_cells.get(key)
+            if cell is None:
+                cell = self.add_element(WaveguideCoplanarStraight, l=length)
+                straight_cells[key] = cell
+            return cell
+
+        # segments are produced after all of them are checked to fit
+        straights = []  # (length, transformation) pairs of straight segments
+        curves = []  # (angle, transformation) pairs of curved segments
+
         # distance between points[0] and beginning of the straight
-        last_cut_dist = 0.0 if self.term1 == 0 else -self.corner_safety_overlap
+        last_cut_dist = 0.0 if self.term1 == 0 else -overlap
 
         # For each segment except the last
-        for i in range(0, len(points) - 2):
+        for i, (alpha, cut_dist) in enumerate(zip(turns.tolist(), cut_dists)):
             # Check if straight can fit between points[i] and points[i + 1]
-            v1, _, alpha1, alpha2, corner_pos = self.get_corner_data(points[i], points[i + 1], points[i + 2], self.r)
-            alpha = (alpha2 - alpha1 + math.pi) % (2 * math.pi) - math.pi  # turn angle (between -pi and pi) in radians
-            # distance between points[i + 1] and beginning of the straight
-            cut_dist = self.r * math.tan(abs(alpha) / 2) - self.corner_safety_overlap
-            straight_length = v1.length() - last_cut_dist - cut_dist
+            straight_length = lengths[i] - last_cut_dist - cut_dist
             if straight_length < 0:
                 self.raise_error_on_cell(
-                    "Straight segment cannot fit. Try decreasing the turn radius.", points[i] + v1 / 2
+                    "Straight segment cannot fit. Try decreasing the turn radius.",
+                    points[i] + (points[i + 1] - points[i]) / 2,
                 )
 
             # Straight segment before corner
-            if straight_length > self.corner_safety_overlap:
-                cell_straight = self.add_element(WaveguideCoplanarStraight, l=straight_length)
-                start_point = points[i] + last_cut_dist / v1.length() * v1
-                transf = pya.DCplxTrans(1, math.degrees(alpha1), False, start_point)
-                self.insert_cell(cell_straight, transf)
+            if straight_length > overlap:
+                start_point = point_on_segment(i, last_cut_dist)
+                straights.append((straight_length, pya.DCplxTrans(1, angles[i], False, start_point)))
 
             # Curved segment at the corner
-            if 2 * cut_dist >= self.corner_safety_overlap:
-                cell_curved = self.add_element(WaveguideCoplanarCurved, alpha=alpha)
-                transf = pya.DCplxTrans(1, math.degrees(alpha1) + (90 if alpha < 0 else -90), False, corner_pos)
-                self.insert_cell(cell_curved, transf)
+            if 2 * cut_dist >= overlap:
+                transf = pya.DCplxTrans(1, curve_angles[i], False, corner_positions[i])
+                curves.append((alpha, transf))
 
             # Prepare for next iteration
             last_cut_dist = cut_dist
 
         # Check if straight can fit between the last two points
-        v1 = points[-1] - points[-2]
-        cut_dist = 0.0 if self.term2 == 0 else -self.corner_safety_overlap
-        straight_length = v1.length() - last_cut_dist - cut_dist
+        cut_dist = 0.0 if self.term2 == 0 else -overlap
+        straight_length = lengths[-1] - last_cut_dist - cut_dist
         if straight_length < 0:
             self.raise_error_on_cell(
-                "Straight segment cannot fit. Try decreasing the turn radius.", points[-2] + v1 / 2
+                "Straight segment cannot fit. Try decreasing the turn radius.",
+                points[-2] + (points[-1] - points[-2]) / 2,
             )
 
         # Straight segment at the end
-        if straight_length > self.corner_safety_overlap:
-            subcell = self.add_element(WaveguideCoplanarStraight, l=straight_length)
-            start_point = points[-2] + last_cut_dist / v1.length() * v1
-            transf = pya.DCplxTrans(1, math.degrees(math.atan2(v1.y, v1.x)), False, start_point)
-            self.insert_cell(subcell, transf)
+        if straight_length > overlap:
+            start_point = point_on_segment(len(lengths) - 1, last_cut_dist)
+            straights.append((straight_length, pya.DCplxTrans(1, angles[-1], False, start_point)))
+
+        if self.fuse_geometry:
+            self._produce_fused_geometry(xy, alphas, turns, signs, corners)
+        else:
+            insert_cell = self.insert_cell
+            for length, transf in straights:
+                insert_cell(straight_cell(length), transf)
+            for alpha, transf in curves:
+                insert_cell(self.add_element(WaveguideCoplanarCurved, alpha=alpha), transf)
 
         # Termination before the first segment
         WaveguideCoplanar.produce_end_termination(self, points[1], points[0], self.term1)
@@ -135,6 +185,138 @@ class WaveguideCoplanar(Element):
         WaveguideCoplanar.produce_end_termination(self, points[-2], points[-1], self.term2)
         self.add_port("b", points[-1], points[-1] - points[-2])
 
+    @staticmethod
+    def _corner_arrays(xy, r):
+        """Returns geometry of all corners of a path.
+
+        Args:
+            xy: path points as array of shape (N, 2)
+            r: curve radius
+
+        Returns:
+            A tuple (``lengths``, ``alphas``, ``angles``, ``turns``, ``signs``, ``tan_halfs``, ``corners``), where
+
+            * ``lengths``: segment lengths, array of length N - 1
+            * ``alphas``: angles between segments and positive x-axis in radians, array of length N - 1
+            * ``angles``: ``alphas`` in degrees
+            * ``turns``: turn angles (between -pi and pi) at corners in radians, array of length N - 2
+            * ``signs``: 1.0 for left turns, where the curve center is on the left side, and -1.0 for other turns
+            * ``tan_halfs``: tangents of half turn angles, i.e. distances from corners to curve ends per radius
+            * ``corners``: positions of curve centers at corners as array of shape (N - 2, 2)
+        """
+        v = np.diff(xy, axis=0)
+        lengths = np.hypot(v[:, 0], v[:, 1])
+        alphas = np.arctan2(v[:, 1], v[:, 0])
+        turns = (alphas[1:] - alphas[:-1] + np.pi) % (2 * np.pi) - np.pi
+        signs = np.where(turns > 0, 1.0, -1.0)
+        inv_half_cos = 1 / np.cos(turns / 2)
+        tan_halfs = np.sin(np.abs(turns) / 2) * inv_half_cos
+        alphacorners = alphas[:-1] + (turns + np.pi) / 2  # corner middle angles plus 90 degrees
+        distcorners = signs * r * inv_half_cos
+        corners = xy[1:-1] + distcorners[:, None] * np.column_stack((np.cos(alphacorners), np.sin(alphacorners)))
+        return lengths, alphas, np.degrees(alphas), turns, signs, tan_halfs, corners
+
+    @staticmethod
+    def _orthogonal_corner_arrays(xy, r):
+        """Returns geometry of all corners of a path, if the path is orthogonal.
+
+        A path is orthogonal if all its segments are parallel to the axes and it has no 180 degree turns. The corner
+        geometry of such path is obtained exactly and without trigonometric functions.
+
+        Args:
+            xy: path points as array of shape (N, 2)
+            r: curve radius
+
+        Returns:
+            The same tuple as ``_corner_arrays``, or None if the path is not orthogonal.
+        """
+        v = np.diff(xy, axis=0)
+        directions = np.sign(v)  # unit vectors along the segments if the path is orthogonal
+        is_axis_parallel = np.abs(directions).sum(axis=1) == 1
+        is_reversed = (directions[1:] * directions[:-1]).sum(axis=1) < 0
+        if not np.all(is_axis_parallel) or np.any(is_reversed):
+            return None
+
+        # number of quarter turns from positive x-axis to each segment, and from each segment to the next one
+        dx, dy = directions[:, 0], directions[:, 1]
+        quarters = np.where(dx > 0, 0, np.where(dy > 0, 1, np.where(dx < 0, 2, 3)))
+        turn_quarters = (np.diff(quarters) + 1) % 4 - 1  # -1, 0 or 1
+
+        lengths = np.abs(v).sum(axis=1)
+        alphas = quarters * (np.pi / 2)
+        turns = turn_quarters * (np.pi / 2)
+        signs = np.where(turn_quarters > 0, 1.0, -1.0)
+        tan_halfs = np.abs(turn_quarters).astype(float)
+        normals = np.column_stack((-dy, dx))  # left-hand normals of the segments
+        corners = xy[1:-1] + r * (signs[:, None] * normals[:-1] - tan_halfs[:, None] * directions[:-1])
+        return lengths, alphas, quarters * 90.0, turns, signs, tan_halfs, corners
+
+    def _produce_fused_geometry(self, xy, alphas, turns, signs, corners):
+        """Produces the waveguide shapes directly into this cell, one shape per layer and side.
+
+        The curved parts are discretized in the same way as in ``WaveguideCoplanarCurved``.
+
+        Args:
+            xy: path points as array of shape (N, 2)
+            alphas: angles between segments and positive x-axis in radians, array of length N - 1
+            turns: turn angles at corners in radians, array of length N - 2
+            signs: 1.0 for left and -1.0 for other turns at corners, array of length N - 2
+            corners: positions of curve centers at corners as array of shape (N - 2, 2)
+        """
+        r, a, b = self.r, self.a, self.b
+
+        # Sample angles and radius multipliers of the corner arcs. Each corner has n_steps + 2 samples, the first
+        # and last are at the arc ends and the others at the middle angles of arc steps scaled outwards by
+        # 1 / cos(step / 2).
+        n_steps = np.maximum(np.round(np.abs(turns) * self.n / (2 * np.pi)), 1).astype(int)
+        steps = turns / n_steps
+        ids = np.repeat(np.arange(len(turns)), n_steps + 2)  # corner index of each sample
+        k = np.arange(len(ids)) - np.repeat(np.cumsum(n_steps + 2) - (n_steps + 2), n_steps + 2)  # index in corner
+        arc_angles = alphas[:-1][ids] - signs[ids] * np.pi / 2 + steps[ids] * np.clip(k - 0.5, 0, n_steps[ids])
+        arc_scales = np.where((k == 0) | (k == n_steps[ids] + 1), 1.0, 1 / np.cos(steps[ids] / 2))
+        arc_directions = np.column_stack((np.cos(arc_angles), np.sin(arc_angles)))
+        ends = xy[[0, -1]]
+        end_normals = np.column_stack((-np.sin(alphas[[0, -1]]), np.cos(alphas[[0, -1]])))  # left-hand normals
+
+        def offset_points(d):
+            """Returns points of the path offset by distance d to the left."""
+            radii = (r - signs[ids] * d) * arc_scales
+            pts = np.concatenate(
+                (
+                    ends[:1] + d * end_normals[:1],
+                    corners[ids] + radii[:, None] * arc_directions,
+                    ends[1:] + d * end_normals[1:],
+                )
+            )
+            # drop repeated points, e.g. the samples of zero-angle corners, that would break polygon sizing
+            pts = pts[np.concatenate(([True], np.any(pts[1:] != pts[:-1], axis=1)))]
+            return [pya.DPoint(x, y) for x, y in pts.tolist()]
+
+        def band(d1, d2):
+            """Returns polygon covering the offsets between d1 and d2 along the path."""
+            return pya.DPolygon(offset_points(d1) + offset_points(d2)[::-1])
+
+        # Left and right gap
+        left_gap = band(a / 2, a / 2 + b)
+        right_gap = band(-a / 2, -a / 2 - b)
+        gap_shapes = self.cell.shapes(self.get_layer("base_metal_gap_wo_grid"))
+        gap_shapes.insert(left_gap)
+        gap_shapes.insert(right_gap)
+
+        # Protection layer
+        if self.ground_grid_in_trace:
+            self.add_protection(left_gap.sized(1))
+            self.add_protection(right_gap.sized(1))
+        else:
+            w = a / 2 + b + self.margin
+            self.add_protection(band(-w, w))
+
+        # Waveguide length
+        shape = pya.DPath(offset_points(0.0), a)
+        self.cell.shapes(self.get_layer("waveguide_path")).insert(shape)
+        if self.add_metal:
+            self.cell.shapes(self.get_layer("base_metal_addition")).insert(shape)
+
     def build(self):
         self.produce_waveguide()
 
@@ -158,15 +340,10 @@ class WaveguideCoplanar(Element):
             * ``corner_pos``: position where the curved waveguide should be placed
 
         """
-        v1 = point2 - point1
-        v2 = point3 - point2
-        alpha1 = math.atan2(v1.y, v1.x)
-        alpha2 = math.atan2(v2.y, v2.x)
-        alpha = (alpha2 - alpha1 + math.pi) % (2 * math.pi) - math.pi  # turn angle (between -pi and pi) in radians
-        alphacorner = alpha1 + (alpha + math.pi) / 2  # corner middle angle plus 90 degrees
-        distcorner = (r if alpha > 0 else -r) / math.cos(alpha / 2)
-        corner_pos = point2 + pya.DVector(math.cos(alphacorner) * distcorner, math.sin(alphacorner) * distcorner)
-        return v1, v2, alpha1, alpha2, corner_pos
+        v1x, v1y, v2x, v2y, alpha1, alpha2, corner_x, corner_y = corner_core(
+            point1.x, point1.y, point2.x, point2.y, point3.x, point3.y, r
+        )
+        return pya.DVector(v1x, v1y), pya.DVector(v2x, v2y), alpha1, alpha2, pya.DPoint(corner_x, corner_y)
 
     @staticmethod
     def produce_end_termination(elem, point_1, point_2, term_len, face_index=0):
@@ -186,34 +363,32 @@ class WaveguideCoplanar(Element):
         a = elem.a
         b = elem.b
 
-        v = (point_2 - point_1) * (1 / point_1.distance(point_2))
-        u = pya.DTrans.R270.trans(v)
-        shift_start = pya.DTrans(pya.DVector(point_2))
-
-        if term_len > 0:
-            poly = pya.DPolygon(
+        x, y = point_2.x, point_2.y
+        dx, dy = x - point_1.x, y - point_1.y
+        inv_len = 1 / math.hypot(dx, dy)
+        vx, vy = dx * inv_len, dy * inv_len  # unit vector in termination direction
+        ux, uy = vy, -vx  # v rotated by 270 degrees
+
+        def rectangle(half_width, length):
+            """Returns rectangle extending from point_2 to distance ``length`` in termination direction."""
+            wx, wy = ux * half_width, uy * half_width
+            lx, ly = vx * length, vy * length
+            return pya.DPolygon(
                 [
-                    pya.DPoint(u * (a / 2 + b)),
-                    pya.DPoint(u * (a / 2 + b) + v * term_len),
-                    pya.DPoint(u * (-a / 2 - b) + v * term_len),
-                    pya.DPoint(u * (-a / 2 - b)),
+                    pya.DPoint(x + wx, y + wy),
+                    pya.DPoint(x + (wx + lx), y + (wy + ly)),
+                    pya.DPoint(x + (lx - wx), y + (ly - wy)),
+                    pya.DPoint(x - wx, y - wy),
                 ]
             )
-            elem.cell.shapes(elem.layout.layer(elem.face(face_index)["base_metal_gap_wo_grid"])).insert(
-                poly.transform(shift_start)
+
+        if term_len > 0:
+            elem.cell.shapes(elem.get_layer("base_metal_gap_wo_grid", face_index)).insert(
+                rectangle(a / 2 + b, term_len)
             )
 
         # protection
-        term_len += elem.margin
-        poly2 = pya.DPolygon(
-            [
-                pya.DPoint(u * (a / 2 + b + elem.margin)),
-                pya.DPoint(u * (a / 2 + b + elem.margin) + v * term_len),
-                pya.DPoint(u * (-a / 2 - b - elem.margin) + v * term_len),
-                pya.DPoint(u * (-a / 2 - b - elem.margin)),
-            ]
-        )
-        elem.add_protection(poly2.transform(shift_start), face_index)
+        elem.add_protection(rectangle(a / 2 + b + elem.margin, term_len + elem.margin), face_index)
 
     @staticmethod
     def is_continuous(waveguide_cell, annotation_layer, tolerance):
@@ -222,7 +397,8 @@ class WaveguideCoplanar(Element):
         The waveguide is considered continuous if the endpoints of its every segment (except first and last) are close
         enough to the endpoints of neighboring segments. The waveguide segments are not necessarily ordered correctly
         when iterating through the cells using begin_shapes_rec. This means we must compare the endpoints of each
-        waveguide segment to the endpoints of all other waveguide segments.
+        waveguide segment to the endpoints of all other waveguide segments, which is done using a spatial search
+        structure.
 
         Args:
             waveguide_cell: Cell of the waveguide.
@@ -230,8 +406,6 @@ class WaveguideCoplanar(Element):
             tolerance: maximum allowed distance between connected waveguide segments
 
         """
-        is_continuous = True
-
         # find the two endpoints for every waveguide segment
 
         endpoints = []  # endpoints of waveguide segment i are contained in endpoints[i][0] and endpoints[i][1]
@@ -241,48 +415,19 @@ class WaveguideCoplanar(Element):
             shape = shapes_iter.shape()
             if shape.is_path():
                 dtrans = shapes_iter.dtrans()  # transformation from shape coordinates to waveguide_cell coordinates
-                pts = shape.each_dpoint()
-                first_point = dtrans * next(pts, None)
-                last_point = first_point.dup()
-                for pt in pts:
-                    last_point = pt
-                last_point = dtrans * last_point
-                endpoints.append([first_point, last_point])
+                pts = list(shape.each_dpoint())  # path points have no random access, but only the ends are needed
+                endpoints.append([dtrans * pts[0], dtrans * pts[-1]])
             shapes_iter.next()
 
         # for every waveguide segment endpoint, try to find another endpoint which is close to it
 
-        num_segments = len(endpoints)
-        num_non_connected_points = 0
-
-        for i in range(num_segments):
-
-            def find_connected_point(point):
-                """Tries to find a waveguide segment endpoint close enough to the given point."""
-
-                found_connected_point = False
-
-                for j in range(num_segments):
-                    # pylint: disable=cell-var-from-loop
-                    if i != j and (
-                        point.distance(endpoints[j][1]) < tolerance or point.distance(endpoints[j][0]) < tolerance
-                    ):
-                        # print("{} | {} | {}".format(point, endpoints[j][1], endpoints[j][0]))
-                        found_connected_point = True
-                        break
-
-                if not found_connected_point:
-                    nonlocal num_non_connected_points
-                    num_non_connected_points += 1
-
-            if endpoints[i][0].distance(endpoints[i][1]) != 0:  # we ignore any zero-length segments
-
-                find_connected_point(endpoints[i][0])
-                find_connected_point(endpoints[i][1])
+        if not endpoints:
+            return True
+        points = np.array([[p0.x, p0.y, p1.x, p1.y] for p0, p1 in endpoints]).reshape(-1, 2)
+        connected = connected_endpoints(points, tolerance)
 
-            # we can have up to 2 non-connected points, because ends of the waveguide don't have to be connected
-            if num_non_connected_points > 2:
-                is_continuous = False
-                break
+        # we ignore any zero-length segments
+        nonzero = np.repeat(np.any(points[0::2] != points[1::2], axis=1), 2)
 
-        return is_continuous
+        # we can have up to 2 non-connected points, because ends of the waveguide don't have to be connected
+        return bool(np.count_nonzero(nonzero & ~connected) <= 2)
@@ -168,7 +168,7 @@ class WaveguideCoplanarCurved(Element):
                 right_inner_arc[-1],
             ]
             shape = pya.DPolygon(pts)
-            elem.cell.shapes(elem.layout.layer(elem.face(face_index)["base_metal_gap_wo_grid"])).insert(trans * shape)
+            elem.cell.shapes(elem.get_layer("base_metal_gap_wo_grid", face_index)).insert(trans * shape)
 
         # grid avoidance for termination
         protection_pts = [
@@ -0,0 +1,168 @@
+# This code is part of KQCircuits
+# Copyright (C) 2024 IQM Finland Oy
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program. If not, see
+# https://www.gnu.org/licenses/gpl-3.0.html.
+#
+# The software distribution should follow IQM trademark policy for open-source software
+# (meetiqm.com/iqm-open-source-trademark-policy). IQM welcomes contributions to the code.
+# Please see our contribution agreements for individuals (meetiqm.com/iqm-individual-contributor-license-agreement)
+# and organizations (meetiqm.com/iqm-organization-contributor-license-agreement).
+
+
+"""Helper module for numeric waveguide geometry functions.
+
+The corner functions take and return plain floats, so that they are compiled with Numba if it is installed. Without
+Numba they run as ordinary Python functions.
+"""
+
+from collections import defaultdict
+from math import atan2, cos, sin, pi, floor, hypot
+
+import numpy as np
+
+try:
+    from scipy import spatial
+except ImportError:
+    spatial = None
+
+try:
+    from numba import njit, prange
+
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+    prange = range
+
+    def njit(*args, **kwargs):  # pylint: disable=unused-argument
+        """Replacement of ``numba.njit`` decorator that returns the function as it is."""
+        return lambda func: func
+
+
+@njit(cache=True)
+def corner_from_angles(x2, y2, alpha1, alpha2, r):
+    """Returns numeric data of a path corner, when the angles of the segments are already known.
+
+    This allows sharing the segment angles between neighbouring corners of a path.
+
+    Args:
+        x2, y2: coordinates of the corner point
+        alpha1: angle between the segment before corner and positive x-axis
+        alpha2: angle between the segment after corner and positive x-axis
+        r: curve radius
+
+    Returns:
+        A tuple (``alpha``, ``cut_dist``, ``corner_x``, ``corner_y``), where ``alpha`` is the turn angle (between -pi
+        and pi), ``cut_dist`` is the distance between the corner point and the ends of the curve, and
+        ``(corner_x, corner_y)`` is the position where the curved waveguide should be placed.
+    """
+    alpha = (alpha2 - alpha1 + pi) % (2 * pi) - pi  # turn angle (between -pi and pi) in radians
+    alphacorner = alpha1 + (alpha + pi) / 2  # corner middle angle plus 90 degrees
+    half_cos = cos(alpha / 2)  # shared by the corner distance and the tangent of the half turn angle
+    distcorner = (r if alpha > 0 else -r) / half_cos
+    cut_dist = r * sin(abs(alpha) / 2) / half_cos
+    return alpha, cut_dist, x2 + cos(alphacorner) * distcorner, y2 + sin(alphacorner) * distcorner
+
+
+@njit(cache=True)
+def corner_core(x1, y1, x2, y2, x3, y3, r):
+    """Returns numeric data needed to create a curved waveguide at path corner.
+
+    Args:
+        x1, y1: coordinates of the point before corner
+        x2, y2: coordinates of the corner point
+        x3, y3: coordinates of the point after corner
+        r: curve radius
+
+    Returns:
+        A tuple (``v1x``, ``v1y``, ``v2x``, ``v2y``, ``alpha1``, ``alpha2``, ``corner_x``, ``corner_y``), where
+        ``(v1x, v1y)`` and ``(v2x, v2y)`` are the vectors from the first point to the corner and from the corner to the
+        last point, ``alpha1`` and ``alpha2`` are their angles with positive x-axis, and ``(corner_x, corner_y)`` is the
+        position where the curved waveguide should be placed.
+    """
+    v1x, v1y = x2 - x1, y2 - y1
+    v2x, v2y = x3 - x2, y3 - y2
+    alpha1 = atan2(v1y, v1x)
+    alpha2 = atan2(v2y, v2x)
+    _, _, corner_x, corner_y = corner_from_angles(x2, y2, alpha1, alpha2, r)
+    return v1x, v1y, v2x, v2y, alpha1, alpha2, corner_x, corner_y
+
+
+def connected_endpoints(points, tolerance):
+    """Returns which segment endpoints are connected to an endpoint of another segment.
+
+    Endpoints are connected if their distance is less than ``tolerance``. A KD-tree is used for finding close
+    endpoints if SciPy is available. Otherwise, all endpoint pairs are compared in parallel compiled code if Numba is
+    available, and a pure Python spatial hash is used if neither is available.
+
+    Args:
+        points: array of shape (2N, 2), where rows 2i and 2i+1 are the endpoints of segment i
+        tolerance: maximum distance between connected endpoints
+
+    Returns:
+        boolean array of length 2N
+    """
+    if spatial is not None:
+        return _connected_endpoints_kd_tree(points, tolerance)
+    if NUMBA_AVAILABLE:
+        return _connected_endpoints_parallel(np.ascontiguousarray(points, dtype=np.float64), float(tolerance))
+    return _connected_endpoints_hash(points, tolerance)
+
+
+def _connected_endpoints_kd_tree(points, tolerance):
+    segment_ids = np.arange(len(points)) // 2
+    pairs = spatial.cKDTree(points).query_pairs(tolerance, output_type="ndarray")
+    p1, p2 = pairs[:, 0], pairs[:, 1]
+    # only endpoints of different segments closer than tolerance are connected
+    is_pair = (segment_ids[p1] != segment_ids[p2]) & (np.hypot(*(points[p1] - points[p2]).T) < tolerance)
+    connected = np.zeros(len(points), dtype=bool)
+    connected[p1[is_pair]] = True
+    connected[p2[is_pair]] = True
+    return connected
+
+
+@njit(cache=True, parallel=True)
+def _connected_endpoints_parallel(points, tolerance):
+    n = points.shape[0]
+    connected = np.zeros(n, dtype=np.bool_)
+    for i in prange(n):  # pylint: disable=not-an-iterable
+        for j in range(n):
+            if i // 2 != j // 2 and hypot(points[i, 0] - points[j, 0], points[i, 1] - points[j, 1]) < tolerance:
+                connected[i] = True
+                break
+    return connected
+
+
+def _connected_endpoints_hash(points, tolerance):
+    connected = np.zeros(len(points), dtype=bool)
+    if tolerance <= 0:
+        return connected
+
+    # Endpoints are hashed into a grid of tolerance sized cells, so each endpoint is compared only to endpoints in the
+    # same or neighbouring cells.
+    pts = points.tolist()
+    keys = [(floor(x / tolerance), floor(y / tolerance)) for x, y in pts]
+    buckets = defaultdict(list)
+    for i, key in enumerate(keys):
+        buckets[key].append(i)
+
+    for i, ((x, y), (kx, ky)) in enumerate(zip(pts, keys)):
+        connected[i] = any(
+            j // 2 != i // 2 and hypot(pts[j][0] - x, pts[j][1] - y) < tolerance
+            for dx in (-1, 0, 1)
+            for dy in (-1, 0, 1)
+            for j in buckets.get((kx + dx, ky + dy), ())
+        )
+    return connected
+
+
+if NUMBA_AVAILABLE:
+    # compile at import time instead of at the first waveguide corner
+    corner_core(0.0, 0.0, 1.0, 0.0, 1.0, 1.0, 1.0)
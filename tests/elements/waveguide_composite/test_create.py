@@ -19,6 +19,7 @@ import pytest
 
 from kqcircuits.elements.waveguide_coplanar_splitter import WaveguideCoplanarSplitter, t_cross_parameters
 from kqcircuits.pya_resolver import pya
+from kqcircuits.defaults import default_faces
 from kqcircuits.elements.waveguide_composite import Node, WaveguideComposite
 from kqcircuits.elements.airbridges.airbridge import Airbridge
 from kqcircuits.elements.airbridge_connection import AirbridgeConnection
@@ -232,3 +233,18 @@ def test_length_before_diagonal_non_90_deg_turns():
     relative_length_error = abs(true_length - length) / length
 
     assert relative_length_error < relative_length_tolerance
+
+
+def test_end_termination_on_changed_face():
+    layout = pya.Layout()
+    nodes = [
+        Node((0, 0), WaveguideCoplanarTaper, a=10, b=6),
+        Node((400, 0), face_id="2b1"),
+        Node((1000, 0), WaveguideCoplanarTaper, a=10, b=6),
+    ]
+    wg = WaveguideComposite.create(layout, nodes=nodes, term1=10, term2=10)
+
+    termination = pya.Region(pya.DBox(1000, -11, 1010, 11).to_itype(layout.dbu))
+    for face_id, expected_area in [("1t1", 0), ("2b1", termination.area())]:
+        gap = pya.Region(wg.begin_shapes_rec(layout.layer(default_faces[face_id]["base_metal_gap_wo_grid"])))
+        assert (gap & termination).area() == expected_area
@@ -18,6 +18,9 @@
 
 
 import math
+
+import pytest
+
 from kqcircuits.pya_resolver import pya
 
 from kqcircuits.elements.waveguide_coplanar import WaveguideCoplanar
@@ -236,3 +239,35 @@ def _assert_correct_length(points, target_length):
     true_length = waveguide_cell.length()
     relative_error = abs(true_length - target_length) / target_length
     assert relative_error < relative_length_tolerance
+
+
+def test_fused_geometry_has_no_child_instances():
+    layout = pya.Layout()
+    points = [pya.DPoint(0, 0), pya.DPoint(300, 0), pya.DPoint(300, 300), pya.DPoint(600, 500)]
+    waveguide_cell = WaveguideCoplanar.create(layout, path=pya.DPath(points, 1), fuse_geometry=True)
+    assert waveguide_cell.child_instances() == 0
+
+
+@pytest.mark.parametrize(
+    "points, params",
+    [
+        ([(0, 0), (300, 0), (300, 300), (600, 500), (200, 700)], {}),
+        ([(0, 0), (100, 0), (200, 0), (200, 200)], {}),
+        ([(0, 0), (300, 0), (300, 300), (-200, 300), (-200, -400)], {}),
+        ([(0, 0), (300, 0), (300, 300), (600, 500), (200, 700)], {"ground_grid_in_trace": True, "add_metal": True}),
+        ([(0, 0), (100, 0), (200, 0), (200, 200)], {"ground_grid_in_trace": True, "add_metal": True}),
+        ([(0, 0), (300, 0), (300, 300), (-200, 300), (-200, -400)], {"ground_grid_in_trace": True}),
+    ],
+)
+def test_fused_geometry_equals_subcell_geometry(points, params):
+    layout = pya.Layout()
+    path = pya.DPath([pya.DPoint(x, y) for x, y in points], 1)
+    cell = WaveguideCoplanar.create(layout, path=path, term1=10, **params)
+    fused_cell = WaveguideCoplanar.create(layout, path=path, term1=10, fuse_geometry=True, **params)
+    for layer_name in ["base_metal_gap_wo_grid", "ground_grid_avoidance", "waveguide_path", "base_metal_addition"]:
+        layer = layout.layer(default_faces["1t1"][layer_name])
+        difference = pya.Region(cell.begin_shapes_rec(layer)) ^ pya.Region(fused_cell.begin_shapes_rec(layer))
+        # allow differences from rounding of the rotated subcells to database units
+        assert difference.sized(-3).is_empty()
+    relative_error = abs(fused_cell.length() - cell.length()) / cell.length()
+    assert relative_error < 1e-4
@@ -0,0 +1,50 @@
+# This code is part of KQCircuits
+# Copyright (C) 2024 IQM Finland Oy
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program. If not, see
+# https://www.gnu.org/licenses/gpl-3.0.html.
+#
+# The software distribution should follow IQM trademark policy for open-source software
+# (meetiqm.com/iqm-open-source-trademark-policy). IQM welcomes contributions to the code.
+# Please see our contribution agreements for individuals (meetiqm.com/iqm-individual-contributor-license-agreement)
+# and organizations (meetiqm.com/iqm-organization-contributor-license-agreement).
+
+
+import numpy as np
+import pytest
+
+from kqcircuits.util.waveguide_math import (
+    _connected_endpoints_kd_tree,
+    _connected_endpoints_parallel,
+    _connected_endpoints_hash,
+)
+
+tolerance = 0.0015
+
+# endpoints of three segments: (0, 0)-(100, 0), (100.001, 0)-(100, 50) and (100, 50.002)-(0, 50)
+points = np.array([[0, 0], [100, 0], [100.001, 0], [100, 50], [100, 50.002], [0, 50]])
+
+connected_endpoints_functions = [_connected_endpoints_kd_tree, _connected_endpoints_parallel, _connected_endpoints_hash]
+
+
+@pytest.mark.parametrize("connected_endpoints", connected_endpoints_functions)
+def test_connected_endpoints(connected_endpoints):
+    assert connected_endpoints(points, tolerance).tolist() == [False, True, True, False, False, False]
+
+
+@pytest.mark.parametrize("connected_endpoints", connected_endpoints_functions)
+def test_endpoints_of_same_segment_are_not_connected(connected_endpoints):
+    assert not np.any(connected_endpoints(np.array([[0, 0], [0, 0.001]]), tolerance))
+
+
+@pytest.mark.parametrize("connected_endpoints", connected_endpoints_functions)
+def test_endpoints_at_negative_coordinates(connected_endpoints):
+    pts = np.array([[-10, -10], [-0.0005, -0.0005], [0.0005, 0.0005], [10, 10]])
+    assert connected_endpoints(pts, tolerance).tolist() == [False, True, True, False]
@@ -0,0 +1,54 @@
+# This code is part of KQCircuits
+# Copyright (C) 2024 IQM Finland Oy
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program. If not, see
+# https://www.gnu.org/licenses/gpl-3.0.html.
+#
+# The software distribution should follow IQM trademark policy for open-source software
+# (meetiqm.com/iqm-open-source-trademark-policy). IQM welcomes contributions to the code.
+# Please see our contribution agreements for individuals (meetiqm.com/iqm-individual-contributor-license-agreement)
+# and organizations (meetiqm.com/iqm-organization-contributor-license-agreement).
+
+
+import math
+
+from kqcircuits.util.waveguide_math import corner_core, corner_from_angles
+
+tolerance = 1e-9
+
+
+def test_left_turn():
+    v1x, v1y, v2x, v2y, alpha1, alpha2, corner_x, corner_y = corner_core(0, 0, 100, 0, 100, 100, 50)
+    assert (v1x, v1y, v2x, v2y) == (100, 0, 0, 100)
+    assert abs(alpha1) < tolerance and abs(alpha2 - math.pi / 2) < tolerance
+    assert abs(corner_x - 50) < tolerance and abs(corner_y - 50) < tolerance
+
+
+def test_right_turn():
+    _, _, _, _, alpha1, alpha2, corner_x, corner_y = corner_core(0, 0, 100, 0, 100, -100, 50)
+    assert abs(alpha1) < tolerance and abs(alpha2 + math.pi / 2) < tolerance
+    assert abs(corner_x - 50) < tolerance and abs(corner_y + 50) < tolerance
+
+
+def test_curve_center_is_at_radius_from_both_segments():
+    r = 30
+    _, _, _, _, _, _, corner_x, corner_y = corner_core(0, 0, 100, 0, 200, 100, r)
+    assert abs(corner_y - r) < tolerance
+    # distance to the line y = x - 100
+    assert abs(abs(corner_x - corner_y - 100) / math.sqrt(2) - r) < tolerance
+
+
+def test_corner_from_angles_matches_corner_core():
+    r = 40
+    _, _, _, _, alpha1, alpha2, corner_x, corner_y = corner_core(0, 0, 100, 50, 150, -80, r)
+    alpha, cut_dist, x, y = corner_from_angles(100, 50, alpha1, alpha2, r)
+    assert abs(x - corner_x) < tolerance and abs(y - corner_y) < tolerance
+    assert abs(alpha - (alpha2 - alpha1)) < tolerance
+    assert abs(cut_dist - r * math.tan(abs(alpha) / 2)) < tolerance